@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import io
+import signal
+from typing import Tuple
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+
+# -----------------------------
+# Forecast worker
+# -----------------------------
+# Runs inside the forecast process pool, so this module stays free of the API's
+# globals and heavy imports; Prophet itself is only imported on first use.
+def init_worker() -> None:
+    # Ctrl+C reaches the whole process group; let the API process shut the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def fit_forecast(fc_df: pd.DataFrame, periods: int) -> Tuple[bytes, str]:
+    from prophet import Prophet
+    model = Prophet()
+    model.fit(fc_df)
+    future = model.make_future_dataframe(periods=periods)
+    forecast = model.predict(future)
+
+    fig = model.plot(forecast)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=72)
+    plt.close(fig)
+
+    # Simple textual summary
+    last_hist = forecast[forecast["ds"] <= fc_df["ds"].max()]["yhat"].tail(7).mean()
+    next_fc = forecast[forecast["ds"] > fc_df["ds"].max()]["yhat"].head(7).mean()
+    trend = "increase" if next_fc > last_hist else "decrease"
+    pct = ((next_fc - last_hist) / max(abs(last_hist), 1e-6)) * 100
+    summary = f"Forecast suggests a {trend} of approximately {pct:.1f}% over the next period."
+    return buf.getvalue(), summary
@@ -1,25 +1,93 @@
 from __future__ import annotations
 
+import asyncio
+import csv
 import io
+import multiprocessing
 import os
+import re
+import threading
 import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+import polars as pl
+import numba
+from numba import get_num_threads, njit, prange
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import xxhash
+from pyarrow import csv as pa_csv
 from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from .forecasting import fit_forecast, init_worker
+
+
+# Kernels are launched from server worker threads; prefer OpenMP over TBB, whose
+# pool can hang interpreter shutdown after launches from non-main threads.
+if "NUMBA_THREADING_LAYER_PRIORITY" not in os.environ:
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
 
 # -----------------------------
 # App & Config
 # -----------------------------
-app = FastAPI(title="AI Shipment Analysis API")
+# Prophet fits run in separate processes so they never hold up the API process.
+# Workers are spawned (not forked) because Polars/Numba thread pools do not survive fork.
+FORECAST_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def forecast_pool() -> ProcessPoolExecutor:
+    global FORECAST_POOL
+    if FORECAST_POOL is None:
+        FORECAST_POOL = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+    return FORECAST_POOL
+
+
+async def fit_in_pool(fc_df: pd.DataFrame, periods: int) -> Tuple[bytes, str]:
+    global FORECAST_POOL
+    for attempt in range(2):
+        pool = forecast_pool()
+        try:
+            return await asyncio.wrap_future(pool.submit(fit_forecast, fc_df, periods))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed) and took the pool with it; start a fresh one
+            if FORECAST_POOL is pool:
+                FORECAST_POOL = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            if attempt:
+                raise
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if FORECAST_POOL is not None:
+        FORECAST_POOL.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="AI Shipment Analysis API", lifespan=lifespan)
 
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
@@ -38,13 +106,63 @@ STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 CHARTS_DIR = os.path.join(STATIC_DIR, "charts")
 os.makedirs(CHARTS_DIR, exist_ok=True)
 
+# Uploaded datasets are persisted here (outside STATIC_DIR so they are not served)
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+# Cheaper Agg rasterization: simplify dense paths and save at a lower DPI
+plt.rcParams.update({
+    "path.simplify": True,
+    "path.simplify_threshold": 1.0,
+    "agg.path.chunksize": 10000,
+    "savefig.dpi": 72,
+})
+
+# Trend charts redraw a single long-lived figure instead of building one per request.
+# Prophet creates its own figure for forecasts, so that path is left alone.
+_TREND_FIG, _TREND_AX = plt.subplots(figsize=(8, 4))
+_TREND_FIG.subplots_adjust(left=0.12, right=0.97, bottom=0.15, top=0.9)
+_FIG_LOCK = threading.Lock()
+# Per-thread scratch buffer that charts are rendered into before hitting disk
+_PNG_BUFFERS = threading.local()
+
+# Above this many points per-point markers are not drawn
+TREND_MARKER_MAX_POINTS = 500
+# Longer series are downsampled to the saved chart's pixel width
+TREND_MAX_POINTS = int(_TREND_FIG.get_figwidth() * plt.rcParams["savefig.dpi"])
+
 
 # -----------------------------
-# In-memory Data Store
+# Data Store
 # -----------------------------
-DATAFRAME: Optional[pd.DataFrame] = None
+@dataclass(frozen=True)
+class Snapshot:
+    """Everything derived from one upload, swapped in as a single reference."""
+
+    # Handle to the Parquet copy of the upload; columns are loaded on demand
+    dataset: ds.Dataset
+    # Lazy Polars scan over the same file, used for the rule-based reductions
+    frame: pl.LazyFrame
+    # Contiguous FlowRate values in dataset row order, for the argmax kernel
+    flow_rates: np.ndarray
+    # Whole-dataset figures computed at upload time
+    stats: Dict[str, Any]
+    # Incremented per upload; part of the /ask cache key
+    version: int
+    # Daily aggregates keyed by (value_col, date_col), filled on first use
+    daily: Dict[Tuple[str, str], pd.Series] = field(default_factory=dict)
+
+
+# Handlers read this once per request; uploads replace it, never mutate it
+SNAPSHOT: Optional[Snapshot] = None
+
+# Forecast results (summary text and chart URL), keyed by (series hash, periods)
+FORECAST_CACHE: Dict[Tuple[bytes, int], Dict[str, Any]] = {}
+# LRU of /ask responses keyed by (snapshot version, normalized question, forecast periods)
+ASK_CACHE: "OrderedDict[Tuple[int, str, Optional[int]], AskResponse]" = OrderedDict()
+ASK_CACHE_SIZE = 256
 
 REQUIRED_COLUMNS = [
     "GrossQuantity",
@@ -62,67 +180,309 @@ REQUIRED_COLUMNS = [
 
 DATETIME_COLUMNS = ["ExitTime", "ScheduledDate", "CreatedTime"]
 
+# GrossQuantity stays float64 because it is summed over the whole dataset;
+# FlowRate is only compared, so float32 precision is plenty.
+NUMERIC_TYPES = {
+    "GrossQuantity": pa.float64(),
+    "FlowRate": pa.float32(),
+}
+
+# Low-cardinality keys stored dictionary-encoded (pandas "category")
+CATEGORY_COLUMNS = ["BayCode", "ShipmentCode", "BaseProductCode", "ShipmentID", "BaseProductID"]
+
+# ISO-8601 dates and date-times, with optional fractional seconds; offset ones are converted to UTC.
+# Fields are range-checked here so only day-of-month overflow (e.g. Feb 30) can fail the cast.
+_ISO_DATE = r"\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])"
+_ISO_TIME = r"[T ]([01]\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d{1,9})?)?"
+_ISO_RE = rf"^{_ISO_DATE}({_ISO_TIME})?$"
+_ISO_OFFSET_RE = rf"^{_ISO_DATE}{_ISO_TIME}(Z|[+-]([01]\d|2[0-3])(:?[0-5]\d)?)$"
+# Indexed by month; February is narrowed to 28 days outside leap years
+_DAYS_IN_MONTH = pa.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], pa.int32())
+# Non-ISO layouts, tried in order; whatever is still unparsed goes through pandas
+DATETIME_FORMATS = [
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%d-%b-%Y",
+]
+
+# Plain decimal/scientific notation; anything else in a numeric column becomes null
+_NUMBER_RE = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+CSV_BLOCK_SIZE = 8 << 20
+
+# Intent keywords, matched as substrings like the original keyword lists
+_FORECAST_RE = re.compile(r"forecast|predict|projection|next ", re.I)
+_TREND_RE = re.compile(r"trend|over time|time series|by day|by month|chart|plot|graph", re.I)
+
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def parse_csv_to_dataframe(file_bytes: bytes) -> pd.DataFrame:
-    buffer = io.BytesIO(file_bytes)
-    df = pd.read_csv(buffer)
+def parse_numbers(values: pa.ChunkedArray, type: pa.DataType) -> pa.ChunkedArray:
+    values = pc.utf8_trim_whitespace(values)
+    valid = pc.match_substring_regex(values, _NUMBER_RE)
+    return pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), type)
+
+
+def _divisible(values: pa.ChunkedArray, n: int) -> pa.ChunkedArray:
+    # Integer divide truncates, so this is values % n == 0
+    return pc.equal(pc.multiply(pc.divide(values, n), n), values)
+
+
+def _on_calendar(values: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Mask of ISO-shaped strings whose day exists in their month and year."""
+    year = pc.cast(pc.utf8_slice_codeunits(values, 0, 4), pa.int32())
+    month = pc.cast(pc.utf8_slice_codeunits(values, 5, 7), pa.int32())
+    day = pc.cast(pc.utf8_slice_codeunits(values, 8, 10), pa.int32())
+    leap = pc.or_(pc.and_(_divisible(year, 4), pc.invert(_divisible(year, 100))), _divisible(year, 400))
+    feb_29 = pc.and_(pc.equal(month, 2), pc.equal(day, 29))
+    return pc.and_(
+        pc.less_equal(day, pc.take(_DAYS_IN_MONTH, month)),
+        pc.or_(pc.invert(feb_29), leap),
+    )
 
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+
+def _cast_or_null(values: pa.ChunkedArray, type: pa.DataType) -> pa.ChunkedArray:
+    try:
+        return pc.cast(values, type)
+    except pa.ArrowInvalid:
+        # Something shaped like a date but not on the calendar (e.g. Feb 30); null those and retry
+        valid = _on_calendar(values)
+        return pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), type)
+
+
+def parse_timestamps(values: pa.ChunkedArray) -> pa.ChunkedArray:
+    values = pc.utf8_trim_whitespace(values)
+    missing = pa.scalar(None, pa.string())
+    iso = pc.match_substring_regex(values, _ISO_RE)
+    parsed = _cast_or_null(pc.if_else(iso, values, missing), pa.timestamp("ns"))
+    offset = pc.match_substring_regex(values, _ISO_OFFSET_RE)
+    if pc.any(offset).as_py():
+        aware = _cast_or_null(pc.if_else(offset, values, missing), pa.timestamp("ns", tz="UTC"))
+        parsed = pc.coalesce(parsed, pc.cast(aware, pa.timestamp("ns")))
+    for fmt in DATETIME_FORMATS:
+        if parsed.null_count == values.null_count:
+            break
+        attempt = pc.strptime(values, format=fmt, unit="ns", error_is_null=True)
+        parsed = pc.coalesce(parsed, attempt)
+    leftover = pc.and_(pc.is_null(parsed), pc.is_valid(values))
+    if pc.any(leftover).as_py():
+        # Anything else pandas can read, parsed once per distinct string; the rest becomes null
+        unique = pc.unique(pc.filter(values, leftover))
+        guessed = pd.to_datetime(unique.to_pandas(), errors="coerce", format="mixed", utc=True)
+        guessed = pa.array(guessed.dt.tz_localize(None), pa.timestamp("ns"))
+        parsed = pc.coalesce(parsed, pc.take(guessed, pc.index_in(values, value_set=unique)))
+    return parsed
+
+
+def parse_datetime_columns(table: pa.Table) -> pa.Table:
+    # Parse all datetime columns as one concatenated array, then slice it back apart
+    n = table.num_rows
+    chunks = [chunk for col in DATETIME_COLUMNS for chunk in table[col].chunks]
+    parsed = parse_timestamps(pa.chunked_array(chunks, type=pa.string()))
+    for i, col in enumerate(DATETIME_COLUMNS):
+        table = table.set_column(table.schema.get_field_index(col), col, parsed.slice(i * n, n))
+    return table
+
+
+def read_header(source: BinaryIO) -> List[str]:
+    line = source.readline()
+    source.seek(0)
+    return next(csv.reader([line.decode("utf-8-sig")]), [])
+
+
+def parse_csv_to_table(source: BinaryIO) -> Tuple[pa.Table, int]:
+    # Every column is read as text so its type never depends on which block is inferred
+    # first. IDs and codes stay text; numerics and datetimes are converted afterwards
+    # so bad values become null.
+    column_types = {col: pa.string() for col in read_header(source)}
+    convert_options = pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=convert_options,
+    )
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in reader.schema.names]
     if missing:
         raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
 
-    for col in DATETIME_COLUMNS:
-        df[col] = pd.to_datetime(df[col], errors="coerce")
+    # Stream record batches instead of materializing the whole upload as bytes
+    batches = []
+    while True:
+        try:
+            batches.append(reader.read_next_batch())
+        except StopIteration:
+            break
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+
+    for col, type in NUMERIC_TYPES.items():
+        table = table.set_column(table.schema.get_field_index(col), col, parse_numbers(table[col], type))
+    table = parse_datetime_columns(table)
+    if table.num_rows and table["ExitTime"].null_count == table.num_rows:
+        raise HTTPException(status_code=400, detail="No ExitTime values could be parsed as dates")
+
+    # Basic cleaning: drop rows missing any key column, as one Arrow mask
+    mask = pc.and_(
+        pc.and_(pc.is_valid(table["GrossQuantity"]), pc.is_valid(table["ShipmentID"])),
+        pc.is_valid(table["ExitTime"]),
+    )
+    dropped = table.num_rows
+    table = table.filter(mask)
+    dropped -= table.num_rows
+
+    for col in CATEGORY_COLUMNS:
+        table = table.set_column(table.schema.get_field_index(col), col, pc.dictionary_encode(table[col]))
+    return table, dropped
+
+
+def write_dataset(table: pa.Table) -> str:
+    path = os.path.join(DATA_DIR, f"dataset_{uuid.uuid4().hex[:8]}.parquet")
+    pq.write_table(table, path, compression="snappy", use_dictionary=True)
+    return path
+
+
+def remove_dataset(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def compute_stats(frame: pl.LazyFrame) -> Dict[str, Any]:
+    row = frame.select(
+        pl.col("ShipmentID").n_unique().alias("unique_shipments"),
+        pl.col("GrossQuantity").sum().alias("total_gross_quantity"),
+    ).collect().row(0, named=True)
+    return {
+        "unique_shipments": int(row["unique_shipments"]),
+        "total_gross_quantity": float(row["total_gross_quantity"]),
+    }
 
-    # Coerce numerics
-    for col in ["GrossQuantity", "FlowRate"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # Basic cleaning: drop fully empty rows in key columns
-    df = df.dropna(subset=["GrossQuantity", "ShipmentID", "ExitTime"], how="any")
-    df = df.reset_index(drop=True)
-    return df
+def load_columns(dataset: ds.Dataset, columns: List[str]) -> pd.DataFrame:
+    return dataset.to_table(columns=columns).to_pandas()
 
 
-def save_plot_return_url(fig, filename_prefix: str) -> str:
-    fig.tight_layout()
+def write_chart(data: memoryview, filename_prefix: str) -> str:
     file_id = f"{filename_prefix}_{uuid.uuid4().hex[:8]}.png"
     path = os.path.join(CHARTS_DIR, file_id)
-    fig.savefig(path)
-    plt.close(fig)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
     return f"/static/charts/{file_id}"
 
 
+def save_plot_return_url(fig, filename_prefix: str, close: bool = True) -> str:
+    buf = getattr(_PNG_BUFFERS, "buf", None)
+    if buf is None:
+        buf = _PNG_BUFFERS.buf = io.BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    fig.savefig(buf, format="png")
+    if close:
+        plt.close(fig)
+    # Release the view before the buffer is truncated for the next chart
+    with buf.getbuffer() as data:
+        return write_chart(data, filename_prefix)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling of a sorted series to n_out points."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xf = x.astype(np.float64)
+    yf = y.astype(np.float64)
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = xf[end:next_end].mean()
+        avg_y = yf[end:next_end].mean()
+        # Twice the triangle area between the last kept point, each candidate and the next bucket's mean
+        area = np.abs((xf[a] - avg_x) * (yf[start:end] - yf[a]) - (xf[a] - xf[start:end]) * (avg_y - yf[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+@njit(parallel=True, cache=True)
+def _argmax_nan_skip(a: np.ndarray, n_chunks: int) -> int:
+    """Index of the first maximum of a, ignoring NaNs; -1 if every value is NaN."""
+    n = a.size
+    chunk = (n + n_chunks - 1) // n_chunks
+    best_idx = np.full(n_chunks, -1, dtype=np.int64)
+    best_val = np.empty(n_chunks, dtype=a.dtype)
+    for c in prange(n_chunks):
+        idx = -1
+        val = -np.inf
+        for i in range(c * chunk, min((c + 1) * chunk, n)):
+            v = a[i]
+            if not np.isnan(v) and (idx == -1 or v > val):
+                idx = i
+                val = v
+        best_idx[c] = idx
+        best_val[c] = val
+    # Chunks are in row order, so strict > keeps the earliest maximum
+    idx = -1
+    val = -np.inf
+    for c in range(n_chunks):
+        if best_idx[c] != -1 and (idx == -1 or best_val[c] > val):
+            idx = best_idx[c]
+            val = best_val[c]
+    return idx
+
+
 def classify_query_intent(query: str) -> str:
-    q = query.lower()
-    if any(k in q for k in ["forecast", "predict", "projection", "next "]):
+    if _FORECAST_RE.search(query):
         return "forecast"
-    if any(k in q for k in ["trend", "over time", "time series", "by day", "by month", "chart", "plot", "graph"]):
+    if _TREND_RE.search(query):
         return "trend"
     return "analysis"
 
 
-def answer_with_rules(df: pd.DataFrame, query: str) -> Dict[str, Any]:
+def answer_with_rules(snap: Snapshot, query: str) -> Dict[str, Any]:
     q = query.lower()
     if "total" in q and "quantity" in q:
-        total = float(df["GrossQuantity"].sum())
+        total = snap.stats["total_gross_quantity"]
         return {"text": f"Total GrossQuantity: {total:,.2f}"}
     if "highest" in q and ("flow" in q or "flowrate" in q):
-        idx = df["FlowRate"].idxmax()
-        row = df.loc[idx]
+        idx = int(_argmax_nan_skip(snap.flow_rates, get_num_threads()))
+        if idx < 0:
+            return {"text": "No FlowRate values available."}
+        row = (
+            snap.frame.select("FlowRate", "BayCode", "ShipmentCode")
+            .slice(idx, 1)
+            .collect()
+            .row(0, named=True)
+        )
         return {
             "text": f"Highest FlowRate {row['FlowRate']:.2f} at Bay {row['BayCode']} for Shipment {row['ShipmentCode']}.",
         }
     if "count" in q and ("shipments" in q or "shipment" in q):
-        cnt = int(df["ShipmentID"].nunique())
+        cnt = snap.stats["unique_shipments"]
         return {"text": f"Unique shipments: {cnt}"}
-    return {"text": "I could not answer with built-in rules. Trying AI analysis..."}
+    return {"text": "I could not answer with built-in rules. Trying AI analysis...", "failed": True}
 
 
-def ai_dataframe_answer(df: pd.DataFrame, query: str) -> Dict[str, Any]:
+def ai_dataframe_answer(snap: Snapshot, query: str) -> Dict[str, Any]:
+    # The agents inspect the whole frame, so load every column here
+    df = snap.frame.collect().to_pandas()
+
     # Try OpenAI first if key provided
     if OPENAI_API_KEY:
         try:
@@ -150,62 +510,64 @@ def ai_dataframe_answer(df: pd.DataFrame, query: str) -> Dict[str, Any]:
             return {"text": str(result["output"])[:4000]}
         return {"text": str(result)[:4000]}
     except Exception:
-        return answer_with_rules(df, query)
+        return answer_with_rules(snap, query)
 
 
-def trend_chart(df: pd.DataFrame, value_col: str = "GrossQuantity", date_col: str = "ExitTime") -> Dict[str, Any]:
-    agg = (
-        df[[date_col, value_col]]
-        .dropna()
-        .set_index(date_col)
-        .sort_index()
-        .resample("D")
-        .sum()
-    )
+def _compute_daily(df: pd.DataFrame, value_col: str, date_col: str) -> pd.Series:
+    # Hashed groupby on the floored timestamps; no index rebuild or full-frame sort
+    days = df[date_col].dt.floor("D")
+    return df.groupby(days, sort=True)[value_col].sum()
+
+
+def daily_aggregate(snap: Snapshot, value_col: str, date_col: str) -> pd.Series:
+    key = (value_col, date_col)
+    agg = snap.daily.get(key)
+    if agg is None:
+        df = load_columns(snap.dataset, [date_col, value_col])
+        agg = snap.daily[key] = _compute_daily(df, value_col, date_col)
+    return agg
+
+
+def trend_chart(snap: Snapshot, value_col: str = "GrossQuantity", date_col: str = "ExitTime") -> Dict[str, Any]:
+    agg = daily_aggregate(snap, value_col, date_col)
     if agg.empty:
         return {"text": "No data to plot"}
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.plot(agg.index, agg[value_col], marker="o", linewidth=2)
-    ax.set_title(f"Daily {value_col} trend")
-    ax.set_xlabel("Date")
-    ax.set_ylabel(value_col)
-    url = save_plot_return_url(fig, f"trend_{value_col}")
+    with _FIG_LOCK:
+        ax = _TREND_AX
+        ax.cla()
+        marker = "o" if len(agg) < TREND_MARKER_MAX_POINTS else None
+        x, y = agg.index.values, agg.values
+        if len(agg) > TREND_MAX_POINTS:
+            x, y = lttb(x.astype("i8"), y, TREND_MAX_POINTS)
+            x = pd.to_datetime(x)
+        ax.plot(x, y, marker=marker, linewidth=2)
+        ax.set_title(f"Daily {value_col} trend")
+        ax.set_xlabel("Date")
+        ax.set_ylabel(value_col)
+        url = save_plot_return_url(_TREND_FIG, f"trend_{value_col}", close=False)
     return {"text": f"Trend of {value_col} over time.", "imageUrl": url}
 
 
-def forecast_gross_quantity(df: pd.DataFrame, periods: int = 14) -> Dict[str, Any]:
-    series = (
-        df[["ExitTime", "GrossQuantity"]]
-        .dropna()
-        .set_index("ExitTime")
-        .sort_index()
-        .resample("D")
-        .sum()
-        .reset_index()
-    )
+async def forecast_gross_quantity(snap: Snapshot, periods: int = 14) -> Dict[str, Any]:
+    series = await run_in_threadpool(daily_aggregate, snap, "GrossQuantity", "ExitTime")
     if series.empty:
         return {"text": "No data available for forecasting"}
 
-    fc_df = series.rename(columns={"ExitTime": "ds", "GrossQuantity": "y"})
+    fc_df = series.rename_axis("ds").reset_index(name="y")
+    digest = xxhash.xxh64()
+    digest.update(fc_df["ds"].values.tobytes())
+    digest.update(fc_df["y"].values.tobytes())
+    key = (digest.digest(), periods)
+    cached = FORECAST_CACHE.get(key)
+    if cached is not None:
+        return cached
     try:
-        from prophet import Prophet
-        model = Prophet()
-        model.fit(fc_df)
-        future = model.make_future_dataframe(periods=periods)
-        forecast = model.predict(future)
-
-        fig = model.plot(forecast)
-        url = save_plot_return_url(fig, "forecast_gross_quantity")
-
-        # Simple textual summary
-        last_hist = forecast[forecast["ds"] <= fc_df["ds"].max()]["yhat"].tail(7).mean()
-        next_fc = forecast[forecast["ds"] > fc_df["ds"].max()]["yhat"].head(7).mean()
-        trend = "increase" if next_fc > last_hist else "decrease"
-        pct = ((next_fc - last_hist) / max(abs(last_hist), 1e-6)) * 100
-        summary = f"Forecast suggests a {trend} of approximately {pct:.1f}% over the next period."
-        return {"text": summary, "imageUrl": url}
+        png, summary = await fit_in_pool(fc_df, periods)
+        url = await run_in_threadpool(write_chart, memoryview(png), "forecast_gross_quantity")
     except Exception as e:
-        return {"text": f"Forecasting failed: {e}"}
+        return {"text": f"Forecasting failed: {e}", "failed": True}
+    result = FORECAST_CACHE[key] = {"text": summary, "imageUrl": url}
+    return result
 
 
 # -----------------------------
@@ -236,12 +598,37 @@ def root() -> Dict[str, str]:
 
 @app.post("/upload")
 async def upload_csv(file: UploadFile = File(...)) -> Dict[str, Any]:
-    global DATAFRAME
+    global SNAPSHOT
     try:
-        content = await file.read()
-        df = parse_csv_to_dataframe(content)
-        DATAFRAME = df
-        return {"message": "CSV loaded", "rows": int(len(df)), "columns": list(df.columns)}
+        # Parsing and the Parquet write are CPU/disk bound; keep them off the event loop
+        table, dropped = await run_in_threadpool(parse_csv_to_table, file.file)
+        path = await run_in_threadpool(write_dataset, table)
+        try:
+            frame = pl.scan_parquet(path)
+            stats = await run_in_threadpool(compute_stats, frame)
+            previous = SNAPSHOT
+            snapshot = Snapshot(
+                dataset=ds.dataset(path, format="parquet"),
+                frame=frame,
+                flow_rates=table["FlowRate"].to_numpy(),
+                stats=stats,
+                version=previous.version + 1 if previous else 1,
+            )
+        except BaseException:
+            # Never published, so nothing else will clean the file up
+            remove_dataset(path)
+            raise
+        # Requests still holding an older snapshot keep its file until they finish
+        weakref.finalize(snapshot, remove_dataset, path)
+        SNAPSHOT = snapshot
+        FORECAST_CACHE.clear()
+        ASK_CACHE.clear()
+        return {
+            "message": "CSV loaded",
+            "rows": table.num_rows,
+            "dropped_rows": dropped,
+            "columns": table.schema.names,
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -250,25 +637,40 @@ async def upload_csv(file: UploadFile = File(...)) -> Dict[str, Any]:
 
 @app.post("/ask", response_model=AskResponse)
 async def ask(req: AskRequest) -> AskResponse:
-    if DATAFRAME is None:
+    snap = SNAPSHOT
+    if snap is None:
         raise HTTPException(status_code=400, detail="No dataset loaded. Upload a CSV first.")
 
     intent = classify_query_intent(req.question)
+    # Only forecasts depend on the period count
+    periods = (req.periods or 14) if intent == "forecast" else None
+    key = (snap.version, req.question.strip().lower(), periods)
+    cached = ASK_CACHE.get(key)
+    if cached is not None:
+        ASK_CACHE.move_to_end(key)
+        return cached
+
     if intent == "forecast":
-        result = forecast_gross_quantity(DATAFRAME, periods=req.periods or 14)
-        return AskResponse(text=result.get("text", ""), imageUrl=result.get("imageUrl"))
+        result = await forecast_gross_quantity(snap, periods=periods)
     elif intent == "trend":
-        result = trend_chart(DATAFRAME)
-        return AskResponse(text=result.get("text", ""), imageUrl=result.get("imageUrl"))
+        result = await run_in_threadpool(trend_chart, snap)
     else:
-        result = answer_with_rules(DATAFRAME, req.question)
-        if result.get("text", "").startswith("I could not answer"):
-            result = ai_dataframe_answer(DATAFRAME, req.question)
-        return AskResponse(text=result.get("text", ""), imageUrl=result.get("imageUrl"))
+        result = await run_in_threadpool(answer_with_rules, snap, req.question)
+        if result.get("failed"):
+            result = await run_in_threadpool(ai_dataframe_answer, snap, req.question)
+
+    response = AskResponse(text=result.get("text", ""), imageUrl=result.get("imageUrl"))
+    # Failures may succeed on retry, so only answers are cached
+    if not result.get("failed"):
+        ASK_CACHE[key] = response
+        if len(ASK_CACHE) > ASK_CACHE_SIZE:
+            ASK_CACHE.popitem(last=False)
+    return response
 
 
 if __name__ == "__main__":
+    # Run from backend/ as `python -m app.main`; the module imports its siblings relatively
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("API_PORT", 8000)))
+    uvicorn.run("app.main:app", host="0.0.0.0", port=int(os.getenv("API_PORT", 8000)))
 
 
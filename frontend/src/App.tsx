@@ -121,11 +121,12 @@ export default function App() {
         headers: { 'Content-Type': 'multipart/form-data' }
       })
       const rows: number | undefined = res?.data?.rows
+      const dropped: number | undefined = res?.data?.dropped_rows
       const columns: string[] | undefined = res?.data?.columns
       const msg: Message = {
         id: generateId(),
         role: 'assistant',
-        text: `CSV loaded${typeof rows === 'number' ? `: ${rows} rows` : ''}. Columns: ${Array.isArray(columns) ? columns.join(', ') : 'n/a'}`
+        text: `CSV loaded${typeof rows === 'number' ? `: ${rows} rows` : ''}${dropped ? ` (${dropped} skipped with missing or unparseable values)` : ''}. Columns: ${Array.isArray(columns) ? columns.join(', ') : 'n/a'}`
       }
       setMessages(m => [...m, msg])
     } catch (err: any) {